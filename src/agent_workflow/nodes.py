@@ -2,25 +2,16 @@ import sys
 from datetime import datetime
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from sentence_transformers import SentenceTransformer
-from langchain_chroma import Chroma
-from langchain.schema import Document
 
-from src.llm_factory.gemini import GoogleGen
+from src.agent_workflow.state import new_metadata, update_state_metadata
 from src.helpers.relevance_checker import *
 from src.helpers.document_retriever import *
 from src.config.logs import get_logger
-
-# Import database configuration and models
-from src.config.database import get_db, Base, engine
-from src.models.user_memory import UserMemory, init_db
 from src.helpers.user_memory_manager import UserMemoryManager
 
-# Initialize the database
-init_db()
-
 import time
 import os
+import re
 from pathlib import Path
 import json
 import uuid
@@ -31,42 +22,82 @@ logger = get_logger(__name__)
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
+# Shared error reply text, built once
+_ERROR_TEXT = "I apologize, but I encountered an error while processing your request. Please try again."
+
+def _apply_error(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the error-state update with the standard error reply.
+
+    Only the delta is returned; the add_messages reducer appends the
+    reply without re-merging the full history.
+    """
+    return {'error_state': True, 'messages': [AIMessage(content=_ERROR_TEXT)]}
+
 class Nodes:
     def __init__(self):
         """Initialize nodes with necessary components."""
         try:
-            self.llm_obj = GoogleGen()
+            # Heavy imports and DB setup are deferred to first
+            # instantiation so importing this module stays cheap
+            from src.llm_factory.gemini import get_gemini
+            from src.models.user_memory import init_db
+
+            init_db()
+            self.llm_obj = get_gemini()
             self.tools = []
             self.llm_obj.llm_with_tools = self.llm_obj.llm.bind_tools(self.tools)
+            # Privacy keywords are redacted in a single compiled-regex
+            # pass instead of one str.replace per keyword
+            self.privacy_keywords = ["social security number", "ssn", "credit card", "password"]
+            self._privacy_re = re.compile(
+                '|'.join(re.escape(keyword) for keyword in self.privacy_keywords),
+                re.IGNORECASE
+            )
+            # Load the guidelines template once; it never changes after startup
+            guidelines_path = os.path.abspath(os.path.join(current_dir, "..", "prompts/guidelines.txt"))
+            with open(guidelines_path, "r") as file:
+                self._guidelines_template = file.read()
             logger.info("Nodes initialized successfully")
         except Exception as e:
-            logger.error(f"Error initializing nodes: {str(e)}")
+            logger.error("Error initializing nodes: %s", e)
             raise
 
+    def _sanitize_input(self, text: str) -> str:
+        """Redact privacy keywords from the text in one pass."""
+        return self._privacy_re.sub('[REDACTED]', text)
+
     def initiate_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Initialize the conversation state"""
-        logger.info(f"Initializing conversation state with patient_id: {state.get('patient_id')}")
-        
-        # Initialize patient info in state
-        state['patient_name'] = ""
-        state['patient_description'] = ""
-        
+        logger.info("Initializing conversation state with patient_id: %s", state.get('patient_id'))
+
+        # Only the changed keys are returned so the message history is
+        # never re-merged by this node
+        update: Dict[str, Any] = {'patient_name': "", 'patient_description': ""}
+
+        # Sanitize user input before it reaches retrieval or the LLM
+        if state.get('user_input'):
+            update['user_input'] = self._sanitize_input(state['user_input'])
+
+        # Initialize session metadata once per thread
+        if not state.get('metadata'):
+            update['metadata'] = new_metadata()
+
         # If patient_id is provided, fetch the patient info
         patient_id = state.get('patient_id', 0)
         if patient_id and int(patient_id) > 0:
             try:
                 patient_info = UserMemoryManager.get_memory_by_user(patient_id)
                 if patient_info:
-                    state['patient_name'] = patient_info.get('name', '')
-                    state['patient_description'] = patient_info.get('description', '')
-                    logger.info(f"Patient info loaded: {state['patient_name']}")
+                    update['patient_name'] = patient_info.get('name', '')
+                    update['patient_description'] = patient_info.get('description', '')
+                    logger.info("Patient info loaded: %s", update['patient_name'])
                 else:
-                    logger.warning(f"No patient found with ID: {patient_id}")
+                    logger.warning("No patient found with ID: %s", patient_id)
             except Exception as e:
-                logger.error(f"Error fetching patient info: {str(e)}")
-        
-        return state
-        #     logger.info(f"Searching knowledge base for: {state['user_input']}")
+                logger.error("Error fetching patient info: %s", e)
+
+        return update
+        #     logger.info("Searching knowledge base for: %s", state['user_input'])
             
         #     embeddings = SentenceTransformerEmbeddings(bi_encoder)
         #     vector_store = Chroma(
@@ -100,75 +131,70 @@ class Nodes:
         #     } for doc, score in scored_results[:k]]
         
         # except Exception as e:
-        #     logger.error(f"Search failed for state['user_input'] '{state['user_input']}': {str(e)}")
+        #     logger.error("Search failed for state['user_input'] '%s': %s", state['user_input'], e)
         #     return []
     
     def document_retriever(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Document retriever"""
-        logger.info(f"Running document retriever")
+        logger.info("Running document retriever")
         try:
             query = state["user_input"]
             search_results = search_qa(query)
-            
+
+            # Return only the delta; add_messages appends any new
+            # message without re-merging the full history
+            update: Dict[str, Any] = {"search_results": search_results}
             if not search_results:
                 logger.warning("No search results found for query")
-                state["search_results"] = []
-                state["messages"].append(
+                update["messages"] = [
                     AIMessage(content="I couldn't find any relevant information in my knowledge base. Could you please rephrase your question or provide more details?")
-                )
-            else:
-                state["search_results"] = search_results
-            
-            logger.info(f"Search results: {state['search_results']}")
-            return state
-        
+                ]
+
+            logger.info("Search results: %s", search_results)
+            return update
+
         except Exception as e:
-            logger.error(f"Error in document retriever: {str(e)}")
-            state["error_state"] = True
-            state["messages"].append(
-                AIMessage(content="I apologize, but I encountered an error while processing your request. Please try again.")
-            )
-            
-            logger.info(f"Error in document retriever: {str(e)}")
-            return state
+            logger.error("Error in document retriever: %s", e)
+            return _apply_error(state)
             
     def relevance_checker(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Check relevance of search results"""
-        logger.info(f"Running relevance checker")
+        logger.info("Running relevance checker")
         try:
             # Skip if no search results
             if not state.get("search_results"):
                 logger.warning("No search results to check for relevance")
-                return state
-                
-            # Check relevance for each result
-            for result in state["search_results"]:
-                result["is_relevant"] = check_relevance(state["user_input"], result)
-            
-            # Filter out irrelevant results
-            state["search_results"] = [
-                result for result in state["search_results"] 
-                if result.get("is_relevant", False)
+                return {"has_relevant_results": False}
+
+            # One batched embed + matrix product covers every result;
+            # no per-result LLM round-trips
+            relevance_flags = check_relevance_batch(state["user_input"], state["search_results"])
+            # Filter in one pass without writing into the result dicts;
+            # checkpoints and caches may hold references to them
+            search_results = [
+                result for result, is_relevant in zip(state["search_results"], relevance_flags)
+                if is_relevant
             ]
-            
-            if not state["search_results"]:
+
+            # Return only the delta, with the routing flag precomputed
+            # so the conditional edge does not rescan the result list
+            update: Dict[str, Any] = {
+                "search_results": search_results,
+                "has_relevant_results": bool(search_results),
+            }
+
+            if not search_results:
                 logger.info("No relevant results found after relevance check")
-                state["messages"].append(
+                update["messages"] = [
                     AIMessage(content="I couldn't find any relevant information for your query. Could you please provide more details or rephrase your question?")
-                )
-                
-            logger.info(f"Search results: {state['search_results']}")
-            return state
+                ]
+
+            logger.info("Search results: %s", search_results)
+            return update
             
         except Exception as e:
-            logger.error(f"Error in relevance checker: {str(e)}")
-            state["error_state"] = True
-            state["messages"].append(
-                AIMessage(content="I apologize, but I encountered an error while processing your request. Please try again.")
-            )
-            
-            logger.info(f"Error in relevance checker: {str(e)}")
-            return state
+            logger.error("Error in relevance checker: %s", e)
+            return _apply_error(state)
             
     def prepare_prompt(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -178,13 +204,13 @@ class Nodes:
             state (Dict[str, Any]): Current state containing user input and search results
             
         Returns:
-            Dict[str, Any]: Updated state with system and user messages
+            Dict[str, Any]: Partial update holding only the new system
+            and user messages; add_messages appends them
         """
         logger.info("Preparing system prompt with dynamic content")
         try:
-            # Read template from file
-            with open(os.path.abspath(os.path.join(current_dir, "..", "prompts/guidelines.txt")), "r") as file:
-                template = file.read()
+            # Use the template preloaded in __init__
+            template = self._guidelines_template
 
             # Format sources
             sources = []
@@ -195,7 +221,7 @@ class Nodes:
             sources_text = "\n\n".join(sources) if sources else "No relevant sources found."
             
             # Log patient info for debugging
-            logger.info(f"Using patient info - Name: {state.get('patient_name', 'N/A')}, Description: {state.get('patient_description', 'N/A')}")
+            logger.info("Using patient info - Name: %s, Description: %s", state.get('patient_name', 'N/A'), state.get('patient_description', 'N/A'))
             
             # Format the template with dynamic content using str.format()
             system_content = template.format(
@@ -211,37 +237,30 @@ class Nodes:
             # User message contains just the query
             user_message = HumanMessage(content=state['user_input'])
             
-            logger.debug(f"System message prepared with {len(sources)} sources")
-            
-            # Add messages to state
-            messages = state.get('messages', [])
-            messages.extend([system_message, user_message])
+            logger.debug("System message prepared with %s sources", len(sources))
             
-            logger.info(f"Messages: {messages}")
-            return {'messages': messages}
+            # Return only the two new messages; the add_messages reducer
+            # appends the delta instead of re-merging the full history
+            new_messages = [system_message, user_message]
+            logger.info("Messages: %s", new_messages)
+            return {'messages': new_messages}
             
         except Exception as e:
-            logger.error(f"Error in prepare_prompt: {str(e)}")
-            state['error_state'] = True
-            state['messages'].append(
-                AIMessage(content="I apologize, but I encountered an error while processing your request. Please try again.")
-            )
-            return state
+            logger.error("Error in prepare_prompt: %s", e)
+            return _apply_error(state)
 
 
     def agent(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Process agent response with error handling and privacy checks."""
-        logger.info(f"Running the agent state")
+        logger.info("Running the agent state")
         try:
             ai_response=[self.llm_obj.llm.invoke(state['messages'])]
-            logger.info(f"AI Response: {ai_response}")
+            logger.info("AI Response: %s", ai_response)
             return {"messages":ai_response}
             
         except Exception as e:
-            logger.error(f"Error in agent node: {str(e)}")
-            state['error_state'] = True
-            state['messages'].append(AIMessage(content="I apologize, but I encountered an error while processing your request. Please try again."))
-            return state
+            logger.error("Error in agent node: %s", e)
+            return _apply_error(state)
 
     def final_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -255,30 +274,41 @@ class Nodes:
         """
         logger.info("Processing final state and adding sources to response")
         try:
+            update: Dict[str, Any] = {}
+
             # Get the last AI message
             if 'messages' in state and state['messages']:
                 last_message = state['messages'][-1]
-                
+
                 # Format sources
                 sources = []
                 for i, res in enumerate(state.get('search_results', []), 1):
                     if 'answer' in res and 'question' in res:
                         sources.append(f"Source {i}:\nQ: {res['question']}\nA: {res['answer']}")
-                
+
                 if sources:
                     sources_text = "\n---\n**Sources:**\n" + "\n".join(sources)
-                    # Append sources to the last message
-                    state['messages'][-1] = AIMessage(
-                        content=last_message.content + sources_text
-                    )
-                    logger.debug(f"Added {len(sources)} sources to the response")
+                    # Reuse the last message id so add_messages replaces
+                    # it in place instead of appending a duplicate
+                    update['messages'] = [AIMessage(
+                        content=last_message.content + sources_text,
+                        id=last_message.id
+                    )]
+                    logger.debug("Added %s sources to the response", len(sources))
                 else:
                     logger.debug("No valid sources found to add to the response")
-            
-            return state
+
+            # Record the interaction with an O(1) running-mean update
+            if state.get('metadata') is not None:
+                update['metadata'] = update_state_metadata(
+                    state['metadata'],
+                    state.get('user_input', ''),
+                    confidence=1.0 if state.get('search_results') else 0.0,
+                    source="knowledge_base" if state.get('search_results') else "no_match"
+                )
+
+            return update
         except Exception as e:
-            logger.error(f"Error in final state: {str(e)}")
-            state['error_state'] = True
-            state['messages'].append(AIMessage(content="I apologize, but I encountered an error while processing your request. Please try again."))
-            return state
+            logger.error("Error in final state: %s", e)
+            return _apply_error(state)
     
\ No newline at end of file
@@ -1,6 +1,11 @@
 from typing_extensions import TypedDict
-from typing import Annotated
+from typing import Annotated, Any, Dict
 from langgraph.graph.message import add_messages
+from collections import deque
+from datetime import datetime
+
+# Ring-buffer capacity for per-session interaction history
+_MAX_INTERACTIONS = 2048
 
 class State(TypedDict):
     user_input: str
@@ -9,4 +14,81 @@ class State(TypedDict):
     patient_id: int
     patient_name: str
     patient_description: str
-    error_state: bool
\ No newline at end of file
+    error_state: bool
+    has_relevant_results: bool
+    metadata: dict
+
+# Keys every completed workflow state must carry. Hoisted to module
+# scope so validate_state does not rebuild the set on every call.
+_REQUIRED_KEYS = frozenset({"user_input", "messages", "search_results", "patient_id", "metadata"})
+
+def validate_state(state: Dict[str, Any]) -> bool:
+    """Check that a state dict carries all required keys."""
+    return _REQUIRED_KEYS.issubset(state) and isinstance(state.get("metadata"), dict)
+
+# Bounded pool of interaction dicts reused across turns to cut
+# allocator pressure in long sessions
+_INTERACTION_POOL: list = []
+_POOL_MAX = 1024
+
+def _acquire_interaction() -> Dict[str, Any]:
+    """Take a cleared interaction dict from the pool, or make a new one."""
+    return _INTERACTION_POOL.pop() if _INTERACTION_POOL else {}
+
+def _release_interaction(interaction: Dict[str, Any]) -> None:
+    """Return an evicted interaction dict to the pool for reuse."""
+    if len(_INTERACTION_POOL) < _POOL_MAX:
+        interaction.clear()
+        _INTERACTION_POOL.append(interaction)
+
+def new_metadata() -> Dict[str, Any]:
+    """Create the session metadata tracked across interactions."""
+    return {
+        "session_start": datetime.now().isoformat(),
+        # Full interaction records, kept for audit/replay only. Bounded
+        # ring buffers so a long-running session cannot grow unbounded;
+        # the running mean below still covers the whole session.
+        "interactions": deque(maxlen=_MAX_INTERACTIONS),
+        # Column layout of the hot fields; analytics read these flat
+        # sequences instead of walking the dict-per-interaction buffer
+        "confidences": deque(maxlen=_MAX_INTERACTIONS),
+        "sources": deque(maxlen=_MAX_INTERACTIONS),
+        "confidence_sum": 0.0,
+        "confidence_count": 0,
+        "avg_confidence": 0.0,
+    }
+
+def update_state_metadata(metadata: Dict[str, Any], query: str, confidence: float, source: str = "") -> Dict[str, Any]:
+    """Record an interaction and update the average confidence.
+
+    The average is maintained as a running mean (sum and count kept in
+    the metadata) so each update is O(1) instead of re-summing the full
+    interaction list every turn.
+
+    Args:
+        metadata: The session metadata dict from the state
+        query: The user query for this interaction
+        confidence: Confidence score for this interaction
+        source: Where the answer came from
+
+    Returns:
+        The updated metadata dict
+    """
+    # Compute the timestamp once per call
+    now_iso = datetime.now().isoformat()
+    interaction = _acquire_interaction()
+    interaction["timestamp"] = now_iso
+    interaction["query"] = query
+    interaction["confidence"] = confidence
+    interaction["source"] = source
+    interactions = metadata["interactions"]
+    if interactions.maxlen is not None and len(interactions) == interactions.maxlen:
+        # The append below evicts the oldest record; recycle its dict
+        _release_interaction(interactions[0])
+    interactions.append(interaction)
+    metadata["confidences"].append(confidence)
+    metadata["sources"].append(source)
+    metadata["confidence_sum"] += confidence
+    metadata["confidence_count"] += 1
+    metadata["avg_confidence"] = metadata["confidence_sum"] / metadata["confidence_count"]
+    return metadata
@@ -1,8 +1,5 @@
-from langgraph.graph import StateGraph
-from src.agent_workflow.nodes import Nodes
-from src.agent_workflow.state import State
+from src.agent_workflow.state import State, validate_state
 from typing import Dict, Any, Callable, Generator, Optional, List
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from src.config.logs import get_logger
 from datetime import datetime
@@ -15,6 +12,12 @@ class WorkFlow:
     def __init__(self):
         """Initialize the oncology assistant workflow"""
         try:
+            # Defer the langgraph and node imports (which pull in the
+            # model SDKs) until a workflow is actually constructed
+            from langgraph.graph import StateGraph
+            from langgraph.checkpoint.memory import MemorySaver
+            from src.agent_workflow.nodes import Nodes
+
             self.nodes = Nodes()
             self.workflow = StateGraph(State)
             
@@ -27,10 +30,13 @@ class WorkFlow:
             # Compile with checkpointing
             memory = MemorySaver()
             self.workflow = self.workflow.compile(checkpointer=memory)
-            self.config={'configurable':{'thread_id':'1'}}
+            # Collision-free per-workflow thread id; uuid4 since the
+            # stdlib has no uuid7 and timestamp-derived ids can collide
+            # under concurrent construction
+            self.config = {'configurable': {'thread_id': uuid.uuid4().hex}}
                 
         except Exception as e:
-            logger.error(f"Failed to initialize workflow: {str(e)}")
+            logger.error("Failed to initialize workflow: %s", e)
             raise
 
     def _setup_nodes(self):
@@ -44,7 +50,7 @@ class WorkFlow:
             self.workflow.add_node('final_state', self.nodes.final_state)
             logger.info("Nodes setup completed")
         except Exception as e:
-            logger.error(f"Error setting up nodes: {str(e)}")
+            logger.error("Error setting up nodes: %s", e)
             raise
 
     def _setup_edges(self):
@@ -60,28 +66,63 @@ class WorkFlow:
             self.workflow.add_edge('final_state', "__end__")
             logger.info("Edges setup completed")
         except Exception as e:
-            logger.error(f"Error setting up edges: {str(e)}")
+            logger.error("Error setting up edges: %s", e)
             raise
 
-    def __call__(self, message: str, patient_id: int = 0):
+    def __call__(self, message: str, patient_id: int = 0, thread_id: Optional[str] = None):
         """Execute the workflow with the given message and optional patient ID
-        
+
         Args:
             message: The user's message
             patient_id: Optional patient ID to retrieve patient context
-            
+            thread_id: Optional checkpoint thread; callers sharing one
+                workflow instance pass their own id per conversation
+
         Returns:
             The workflow response
         """
+        config = {'configurable': {'thread_id': thread_id}} if thread_id else self.config
         response = self.workflow.invoke(
             {
                 'user_input': message,
                 'patient_id': patient_id if patient_id else 0
             },
-            self.config
+            config
         )
+        if not validate_state(response):
+            logger.warning("Workflow returned an incomplete state")
         return response
     
+    def stream(self, message: str, patient_id: int = 0, thread_id: Optional[str] = None):
+        """Yield (node, content) pairs as workflow nodes emit messages
+
+        Lets callers surface partial output — retrieval notices, the
+        agent's answer, the sourced final reply — as each node
+        completes instead of waiting for the full invoke.
+
+        Args:
+            message: The user's message
+            patient_id: Optional patient ID to retrieve patient context
+            thread_id: Optional checkpoint thread (see __call__)
+
+        Yields:
+            Tuples of (node name, message content)
+        """
+        config = {'configurable': {'thread_id': thread_id}} if thread_id else self.config
+        for update in self.workflow.stream(
+            {
+                'user_input': message,
+                'patient_id': patient_id if patient_id else 0
+            },
+            config,
+            stream_mode='updates'
+        ):
+            for node_name, node_update in update.items():
+                for msg in (node_update or {}).get('messages') or []:
+                    content = getattr(msg, 'content', None)
+                    if content and isinstance(msg, AIMessage):
+                        yield node_name, content
+
     def show_state(self) -> None:
         """Display the current conversation state"""
         try:
@@ -103,28 +144,24 @@ class WorkFlow:
                 print(f"Interactions: {len(meta.get('interactions', []))}")
                 print(f"Avg Confidence: {meta.get('avg_confidence', 0.0):.2f}")
         except Exception as e:
-            logger.error(f"Error showing state: {str(e)}")
+            logger.error("Error showing state: %s", e)
 
     def return_state_value(self, state_name: str) -> Optional[list]:
         """Return specific state values"""
         try:
             state = self.workflow.get_state(self.config)
             if not state or state_name not in state.values:
-                logger.warning(f"State '{state_name}' not found")
+                logger.warning("State '%s' not found", state_name)
                 return None
                 
             value = state.values[state_name]
             return list(value) if isinstance(value, (list, tuple)) else [value]
         except Exception as e:
-            logger.error(f"Error returning state value: {str(e)}")
+            logger.error("Error returning state value: %s", e)
             return None
         
     def condition_function(self, state: Dict[str, Any]) -> bool:
         """Condition function to check if the search results are relevant"""
-        
-        try:
-            logger.info(f"This is the search results: {state['search_results']}")
-            return any(result['is_relevant'] for result in state['search_results'])
-        except Exception as e:
-            logger.error(f"Error in condition function: {str(e)}")
-            return False
\ No newline at end of file
+        # Read the flag precomputed by the relevance checker instead of
+        # rescanning every result on each transition
+        return state.get('has_relevant_results', False)
\ No newline at end of file
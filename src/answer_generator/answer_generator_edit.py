@@ -1,56 +1,199 @@
-from typing import Dict, Any
-from src.llm_factory.gemini import GoogleGen
-from src.relevance_check.relevance_check import HybridRelevanceChecker
-from langchain_core.messages import HumanMessage, SystemMessage
-import logging
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-class AnswerGenerator:
-    def __init__(self):
-        self.llm = GoogleGen()
-        self.relevance_checker = HybridRelevanceChecker()
-        self.system_prompt = """You are an oncology specialist AI. You must:
-        - Only answer confirmed cancer-related questions
-        - Provide concise, accurate information
-        - For unmatched questions, respond:
-        "I don't have a verified answer for this oncology question."
-        - For non-oncology questions:
-        "I only answer cancer-related questions."""
-
-    def generate(self, query: str) -> Dict[str, Any]:
-        # Initial oncology check
-        if not self.relevance_checker.is_oncology_related(query):
-            return {
-                'answer': "I only answer cancer-related questions.",
-                'source': 'filtered',
-                'confidence': 1.0
-            }
-        
-        # Check for direct matches
-        match_result = self.relevance_checker.check_match(query)
-        
-        # Return direct match if exists
-        if match_result['status'] == 'direct_match':
-            return {
-                'answer': match_result['match_data']['answer'],
-                'source': 'verified_answer',
-                'confidence': match_result['match_data']['confidence']
-            }
-        
-        # For no-match oncology questions
-        if match_result['status'] == 'no_match':
-            return {
-                'answer': "I don't have a verified answer for this oncology question.",
-                'source': 'no_match',
-                'confidence': 0.0
-            }
-        
-        # Fallback (shouldn't reach here with current logic)
-        return {
-            'answer': "I can't provide an answer at this time.",
-            'source': 'error',
-            'confidence': 0.0
-        }
\ No newline at end of file
+import asyncio
+import functools
+import re
+from typing import Dict, Any, List, Optional
+
+from cachetools import TTLCache
+from src.llm_factory.gemini import get_gemini
+from src.relevance_check.relevance_check_edit import HybridRelevanceChecker
+from langchain_core.messages import HumanMessage, SystemMessage
+from src.config.logs import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+# Normalization patterns for the query cache
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def _normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace for caching."""
+    return _WHITESPACE_RE.sub(' ', _PUNCT_RE.sub('', query.lower())).strip()
+
+@functools.lru_cache(maxsize=4096)
+def _token_len(query: str) -> int:
+    """Approximate token count (~4 characters per token), memoized.
+
+    Gemini exposes no client-side tokenizer (token counts come from a
+    server API call), so the heuristic is computed once per distinct
+    query and reused across bucketing decisions.
+    """
+    return max(1, len(query) // 4)
+
+class BatchScheduler:
+    """Coalesce concurrent relevance-check calls into batched requests.
+
+    Queries submitted by concurrent sessions are buffered on an asyncio
+    queue and flushed as one batch as soon as MAX_BATCH queries are
+    waiting or MAX_WAIT seconds have passed, amortizing the fixed
+    per-call overhead of the embedding and LLM backends.
+    """
+
+    MAX_BATCH = 32
+
+    # Token-length bucket upper bounds with their flush timers. Prompts
+    # of similar length are batched together so a batch is not padded to
+    # one outlier; short-prompt buckets flush sooner since they are the
+    # latency-sensitive ones, long-prompt buckets can wait longer.
+    BUCKETS = ((64, 0.01), (128, 0.02), (256, 0.02), (512, 0.04), (float('inf'), 0.04))
+
+    def __init__(self, relevance_checker: HybridRelevanceChecker):
+        self.relevance_checker = relevance_checker
+        self._queues: Dict[float, asyncio.Queue] = {
+            bound: asyncio.Queue() for bound, _ in self.BUCKETS
+        }
+        self._worker_tasks: Dict[float, asyncio.Task] = {}
+
+    def _bucket(self, query: str):
+        """Return the (bound, max_wait) bucket for a query."""
+        tokens = _token_len(query)
+        for bound, max_wait in self.BUCKETS:
+            if tokens <= bound:
+                return bound, max_wait
+        return self.BUCKETS[-1]
+
+    async def submit(self, query: str) -> Dict[str, Any]:
+        """Queue a query in its length bucket and wait for its result."""
+        loop = asyncio.get_running_loop()
+        bound, max_wait = self._bucket(query)
+        worker = self._worker_tasks.get(bound)
+        if worker is None or worker.done():
+            self._worker_tasks[bound] = loop.create_task(
+                self._worker(self._queues[bound], max_wait)
+            )
+        future = loop.create_future()
+        await self._queues[bound].put((query, future))
+        return await future
+
+    async def _worker(self, queue: asyncio.Queue, max_wait: float):
+        """Drain one bucket queue and issue one batched call per window."""
+        loop = asyncio.get_running_loop()
+        while True:
+            query, future = await queue.get()
+            batch = [(query, future)]
+            deadline = loop.time() + max_wait
+            while len(batch) < self.MAX_BATCH:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            queries = [q for q, _ in batch]
+            logger.info("Running batched relevance check for %s queries", len(queries))
+            try:
+                results = await loop.run_in_executor(
+                    None, self.relevance_checker.check_match_batch, queries
+                )
+            except Exception as e:
+                logger.error("Batched relevance check failed: %s", e)
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+class AnswerGenerator:
+    # Shared across instances so concurrent sessions land in the same batch
+    _scheduler: Optional[BatchScheduler] = None
+
+    _MATCH_CACHE_SIZE = 4096
+
+    def __init__(self):
+        self.llm = get_gemini()
+        self.relevance_checker = HybridRelevanceChecker()
+        if AnswerGenerator._scheduler is None:
+            AnswerGenerator._scheduler = BatchScheduler(self.relevance_checker)
+        # Exact repeats of a normalized query skip embedding + search
+        # entirely. Keyed on the normalized form, but the stored result
+        # comes from checking the original text: normalization strips
+        # hyphens and casing ("HER2-positive" -> "her2positive") that
+        # retrieval needs to see. TTLCache evicts per entry, mirroring
+        # the gate cache in the relevance checker
+        self._match_cache = TTLCache(maxsize=self._MATCH_CACHE_SIZE, ttl=3600)
+        self.system_prompt = """You are an oncology specialist AI. You must:
+        - Only answer confirmed cancer-related questions
+        - Provide concise, accurate information
+        - For unmatched questions, respond:
+        "I don't have a verified answer for this oncology question."
+        - For non-oncology questions:
+        "I only answer cancer-related questions."""
+
+    def _check_match(self, query: str) -> Dict[str, Any]:
+        """Run the relevance check, caching verified matches by normalized query."""
+        cache_key = _normalize_query(query)
+        result = self._match_cache.get(cache_key)
+        if result is None:
+            result = self.relevance_checker.check_match(query)
+            # Only direct matches are known to come from successful LLM
+            # calls; off_topic and no_match are also what the checker's
+            # error paths return, and a transient Gemini outage must
+            # not be memoized as a lasting verdict. Genuine off-topic
+            # verdicts are already TTL-cached inside the gate check.
+            if result['status'] == 'direct_match':
+                self._match_cache[cache_key] = result
+        return result
+
+    def _build_response(self, match_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a relevance-check result to the response payload."""
+        if match_result['status'] == 'off_topic':
+            return {
+                'answer': "I only answer cancer-related questions.",
+                'source': 'filtered',
+                'confidence': 1.0
+            }
+
+        # Return direct match if exists
+        if match_result['status'] == 'direct_match':
+            return {
+                'answer': match_result['match_data']['answer'],
+                'source': 'verified_answer',
+                'confidence': match_result['match_data']['confidence']
+            }
+
+        # For no-match oncology questions
+        if match_result['status'] == 'no_match':
+            return {
+                'answer': "I don't have a verified answer for this oncology question.",
+                'source': 'no_match',
+                'confidence': 0.0
+            }
+
+        # Fallback (shouldn't reach here with current logic)
+        return {
+            'answer': "I can't provide an answer at this time.",
+            'source': 'error',
+            'confidence': 0.0
+        }
+
+    def generate(self, query: str) -> Dict[str, Any]:
+        # Initial oncology check
+        if not self.relevance_checker.is_oncology_related(query):
+            return {
+                'answer': "I only answer cancer-related questions.",
+                'source': 'filtered',
+                'confidence': 1.0
+            }
+
+        # Check for direct matches (cached on the normalized query)
+        match_result = self._check_match(query)
+        return self._build_response(match_result)
+
+    async def generate_async(self, query: str) -> Dict[str, Any]:
+        """Async variant of generate that batches relevance checks
+        across concurrent sessions through the shared scheduler."""
+        match_result = await AnswerGenerator._scheduler.submit(query)
+        return self._build_response(match_result)
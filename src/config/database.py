@@ -1,6 +1,7 @@
 from pathlib import Path
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import scoped_session, sessionmaker, declarative_base
 
 # Database configuration
 PROJECT_ROOT = Path(__file__).parent.parent.parent  # Go up to project root
@@ -9,14 +10,26 @@ DB_DIR.mkdir(exist_ok=True)
 DB_PATH = DB_DIR / 'user_memories.db'
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH.absolute()}"
 
-# Create database engine
+# Create database engine with an explicit connection pool so sessions
+# reuse open connections instead of reconnecting per call
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=1800
 )
 
-# Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Session factory; scoped_session hands each thread its own session
+# so repeated calls on the same thread skip session construction
+SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+
+# Async engine over aiosqlite for the request handlers; DB calls await
+# on the event loop instead of blocking a thread-pool worker
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH.absolute()}"
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
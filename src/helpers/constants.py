@@ -1,11 +1,51 @@
 """Constants and shared configurations for the helpers module."""
+import functools
+import logging
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 
-# Initialize models
-bi_encoder = SentenceTransformer('all-MiniLM-L6-v2')
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=1)
+def get_bi_encoder():
+    """Load the shared bi-encoder on first use (built once per process).
+
+    Loading lazily keeps importing this module cheap (~100MB RAM and
+    ~1s saved on paths that never embed). The ONNX Runtime backend runs
+    these MiniLM models 2-4x faster on CPU than PyTorch eager mode;
+    fall back to the default backend when onnxruntime/optimum are not
+    installed.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    # Prefer the INT8-quantized ONNX export: half the weight bytes and
+    # VNNI int8 dot products for 2-4x over FP32 on modern CPUs, with
+    # negligible retrieval-quality loss at 384 dimensions
+    try:
+        return SentenceTransformer(
+            'all-MiniLM-L6-v2',
+            backend='onnx',
+            model_kwargs={'file_name': 'onnx/model_qint8_avx512_vnni.onnx'}
+        )
+    except Exception as e:
+        logger.warning("Quantized ONNX model unavailable (%s); trying FP32 ONNX", e)
+    try:
+        return SentenceTransformer('all-MiniLM-L6-v2', backend='onnx')
+    except Exception as e:
+        logger.warning("ONNX backend unavailable (%s); using the PyTorch backend", e)
+
+    model = SentenceTransformer('all-MiniLM-L6-v2')
+    # Last resort: dynamically quantize the linear layers in place so
+    # the eager PyTorch path still gets the int8 kernels
+    try:
+        import torch
+        model[0].auto_model = torch.quantization.quantize_dynamic(
+            model[0].auto_model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    except Exception as e:
+        logger.warning("Dynamic quantization failed (%s); running FP32", e)
+    return model
 
 # Path setup
 SCRIPT_DIR = Path(__file__).parent
 DATA_FILE = SCRIPT_DIR / '../../data/data_oncology.xlsx'
-VECTOR_STORE_DIR = SCRIPT_DIR / '../../chroma_db_oncology'
+VECTOR_STORE_DIR = SCRIPT_DIR / '../../faiss_db_oncology'
@@ -1,16 +1,20 @@
-from langchain_chroma import Chroma
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain.schema import Document
 from sentence_transformers import CrossEncoder
 from typing import List, Dict, Any, Optional
-import logging
 from pathlib import Path
+import functools
+
+import numpy as np
+
+from src.config.logs import get_logger
 
 # Import from constants to share models and paths
-from .constants import bi_encoder, VECTOR_STORE_DIR
+from .constants import get_bi_encoder, VECTOR_STORE_DIR
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Initialize logger
+logger = get_logger(__name__)
 
 # Initialize cross-encoder for re-ranking
 cross_encoder = None
@@ -19,46 +23,130 @@ def get_cross_encoder():
     """Lazy load the cross-encoder to avoid loading it if not needed."""
     global cross_encoder
     if cross_encoder is None:
-        cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+        # Prefer the INT8-quantized ONNX export, then FP32 ONNX, then
+        # eager PyTorch — same ladder as get_bi_encoder
+        try:
+            cross_encoder = CrossEncoder(
+                'cross-encoder/ms-marco-MiniLM-L-6-v2',
+                backend='onnx',
+                model_kwargs={'file_name': 'onnx/model_qint8_avx512_vnni.onnx'}
+            )
+        except Exception as e:
+            logger.warning("Quantized ONNX model unavailable (%s); trying FP32 ONNX", e)
+            try:
+                cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2', backend='onnx')
+            except Exception as e:
+                logger.warning("ONNX backend unavailable (%s); using the PyTorch backend", e)
+                cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
     return cross_encoder
 
 class SentenceTransformerEmbeddings:
     def __init__(self, model):
         self.model = model
-    
+
     def embed_documents(self, texts):
-        return self.model.encode(texts).tolist()
-    
+        # Batched, normalized, numpy-native encoding; sentence-transformers
+        # sorts by length internally so each batch pads to its own max
+        return self.model.encode(
+            texts,
+            batch_size=64,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).tolist()
+
     def embed_query(self, text):
-        return self.model.encode(text).tolist()
+        return self.model.encode(
+            text,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).tolist()
 
 
-def format_result(doc: Document) -> Dict[str, Any]:
+def format_result(doc: Document, score: Optional[float] = None) -> Dict[str, Any]:
     """Format a document into a result dictionary."""
     # Parse the question and answer from the page_content
     content = doc.page_content
     question = ""
     answer = ""
-    
+
     # The content is in format "Question: ...\nAnswer: ..."
     if "Question:" in content and "Answer:" in content:
         parts = content.split("Answer:", 1)
         question = parts[0].replace("Question:", "").strip()
         answer = parts[1].strip() if len(parts) > 1 else ""
-    
-    return {
+
+    result = {
         "question": question,
         "answer": answer,
     }
+    # Inner product over normalized vectors is cosine similarity, so
+    # downstream relevance checks can reuse it without re-embedding
+    if score is not None:
+        result["score"] = score
+    return result
+
+@functools.lru_cache(maxsize=1)
+def get_embeddings() -> "SentenceTransformerEmbeddings":
+    """Return the shared embedding wrapper (built once per process)."""
+    return SentenceTransformerEmbeddings(get_bi_encoder())
+
+@functools.lru_cache(maxsize=2048)
+def _query_embedding(query: str) -> tuple:
+    """Embed a query once and cache it (as a tuple, for hashability).
 
-def get_vector_store() -> Chroma:
-    """Initialize and return the Chroma vector store."""
-    embeddings = SentenceTransformerEmbeddings(bi_encoder)
-    return Chroma(
-        collection_name="oncology_qa",
-        embedding_function=embeddings,
-        persist_directory=str(VECTOR_STORE_DIR)
-    )
+    Repeated queries — common in interactive chat and workflow loops —
+    skip the MiniLM forward pass entirely on a hit.
+    """
+    return tuple(get_embeddings().embed_query(query))
+
+@functools.lru_cache(maxsize=1)
+def get_vector_store() -> FAISS:
+    """Load the FAISS vector store once per process.
+
+    FAISS avoids the pickle round-trip Chroma pays on every open, and a
+    flat index outperforms HNSW at this corpus size. The index file is
+    mmapped read-only where supported so pages are demand-faulted (and
+    shared across uvicorn workers) instead of copied into each RSS.
+    """
+    try:
+        import faiss
+        import pickle
+
+        index = faiss.read_index(
+            str(VECTOR_STORE_DIR / "index.faiss"),
+            faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        )
+        with open(VECTOR_STORE_DIR / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        vector_store = FAISS(
+            embedding_function=get_embeddings(),
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+    except Exception as e:
+        logger.warning("mmap load failed (%s); reading the index into memory", e)
+        vector_store = FAISS.load_local(
+            str(VECTOR_STORE_DIR),
+            get_embeddings(),
+            allow_dangerous_deserialization=True,
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+    # Large corpora get an OPQ+IVF index from init_vectorstore; the
+    # IndexPreTransform wrapper it arrives in has no nprobe attribute,
+    # so reach through to the inner IVF index to probe a handful of
+    # cells for a good recall/latency balance. extract_index_ivf
+    # raises for the exact flat index used at small corpus sizes,
+    # where there is nothing to tune.
+    try:
+        import faiss
+        faiss.extract_index_ivf(vector_store.index).nprobe = 16
+    except Exception:
+        pass
+    return vector_store
 
 def search_qa(query: str, k: int = 5, use_cross_encoder: bool = False) -> List[Dict[str, Any]]:
     """
@@ -74,37 +162,47 @@ def search_qa(query: str, k: int = 5, use_cross_encoder: bool = False) -> List[D
     """
     try:
         
-        logger.info(f"Searching knowledge base for: {query}")
+        logger.info("Searching knowledge base for: %s", query)
         
         vector_store = get_vector_store()
-        docs = vector_store.get()
-        logger.info(f"printing all the doc that exist in vector store")
-        logger.info('---------------------------------')
-        for i, doc in enumerate(docs['documents']):
-            print(f"\nDocument {i+1}:")
-            print(doc)
-        logger.info('---------------------------------')
         fetch_count = k * 3 if use_cross_encoder else k
-        initial_results = vector_store.similarity_search(query, k=fetch_count)
-        
+        initial_results = vector_store.similarity_search_with_score_by_vector(
+            list(_query_embedding(query)), k=fetch_count
+        )
+
         if not initial_results:
             return []
-            
+
         if not use_cross_encoder:
-            return [format_result(doc) for doc in initial_results[:k]]
-        
-        
-        # Re-rank with cross-encoder
-        query_doc_pairs = [(query, doc.page_content) for doc in initial_results]
+            return [format_result(doc, float(score)) for doc, score in initial_results[:k]]
+
+
+        # Re-rank with cross-encoder; predict in length-sorted order so
+        # each batch pads to similarly sized pairs, then restore order
+        query_doc_pairs = [(query, doc.page_content) for doc, _ in initial_results]
         cross_encoder = get_cross_encoder()
-        scores = cross_encoder.predict(query_doc_pairs)
-        
-        # Combine results with scores and sort
-        scored_results = zip(initial_results, scores)
-        top_results = sorted(scored_results, key=lambda x: x[1], reverse=True)[:k]
-        
-        return [format_result(doc) for doc in top_results]
+        order = sorted(range(len(query_doc_pairs)), key=lambda idx: len(query_doc_pairs[idx][1]))
+        sorted_scores = cross_encoder.predict(
+            [query_doc_pairs[idx] for idx in order],
+            batch_size=32,
+            show_progress_bar=False
+        )
+        # Scatter the scores back to the original order in one fancy-index
+        # assignment, straight into the array the top-k selection uses
+        scores_arr = np.empty(len(query_doc_pairs), dtype=np.float32)
+        scores_arr[order] = np.asarray(sorted_scores, dtype=np.float32)
+
+        # Select the top k via argpartition (O(N)) instead of sorting
+        # the full candidate list, then order just those k
+        top_k = min(k, len(scores_arr))
+        top_idx = np.argpartition(-scores_arr, top_k - 1)[:top_k]
+        top_idx = top_idx[np.argsort(-scores_arr[top_idx])]
+
+        return [
+            format_result(initial_results[idx][0], float(initial_results[idx][1]))
+            for idx in top_idx
+        ]
         
     except Exception as e:
-        logger.error(f"Search failed for query '{query}': {str(e)}", exc_info=True)
+        logger.error("Search failed for query '%s': %s", query, e, exc_info=True)
         return []
\ No newline at end of file
@@ -1,46 +1,78 @@
-import logging
+import faiss
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from langchain_chroma import Chroma
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain.schema import Document
 from dotenv import load_dotenv
 
-from src.helpers.constants import bi_encoder, VECTOR_STORE_DIR, DATA_FILE, SCRIPT_DIR
+from src.helpers.constants import get_bi_encoder, VECTOR_STORE_DIR, DATA_FILE, SCRIPT_DIR
 from src.helpers.document_retriever import SentenceTransformerEmbeddings
+from src.config.logs import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+def _load_qa_rows(path) -> pd.DataFrame:
+    """Stream the Q&A sheet row by row, dropping exact duplicates on the fly.
+
+    read_only mode keeps one row in memory at a time instead of
+    materializing the whole sheet, and the hash set replaces the
+    drop_duplicates pass over a full intermediate DataFrame.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.active
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows)
+        q_idx = header.index('Question')
+        a_idx = header.index('Answer')
+
+        seen = set()
+        questions, answers = [], []
+        for row in rows:
+            question, answer = row[q_idx], row[a_idx]
+            if question is None or answer is None:
+                continue
+            key = hash((question, answer))
+            if key in seen:
+                continue
+            seen.add(key)
+            questions.append(str(question))
+            answers.append(str(answer))
+    finally:
+        workbook.close()
+
+    return pd.DataFrame({'Question': questions, 'Answer': answers})
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 
 def _remove_duplicates(df: pd.DataFrame, similarity_threshold: float = 0.85) -> pd.DataFrame:
+    """Drop near-duplicate questions (exact duplicates are removed at load)."""
     logger.info("Removing duplicates from dataset")
     print(f"Initial number of entries: {len(df)}")
-    
-    # 1. Remove exact duplicates
-    df = df.drop_duplicates(subset=['Question', 'Answer'], keep='first')
-    print(f"After removing exact duplicates: {len(df)}")
-    
-    # 2. Remove similar questions
+
+    # Remove similar questions
     if len(df) > 1:
         questions = df['Question'].tolist()
-        question_embeddings = bi_encoder.encode(questions)
-        similarity_matrix = np.dot(question_embeddings, question_embeddings.T)
-        
-        to_drop = set()
-        for i in range(len(df)):
-            if i in to_drop:
-                continue
-            for j in range(i + 1, len(df)):
-                if j in to_drop:
-                    continue
-                if similarity_matrix[i, j] > similarity_threshold:
-                    if len(df.iloc[i]['Answer']) < len(df.iloc[j]['Answer']):
-                        to_drop.add(i)
-                    else:
-                        to_drop.add(j)
-        
-        df = df.drop(df.index[list(to_drop)])
+        question_embeddings = np.asarray(get_bi_encoder().encode(questions), dtype=np.float32)
+        # Normalize so the dot product is cosine similarity
+        question_embeddings /= np.linalg.norm(question_embeddings, axis=1, keepdims=True)
+        similarity_matrix = question_embeddings @ question_embeddings.T
+
+        # Only the upper triangle holds distinct pairs; find the
+        # near-duplicates in one vectorized pass instead of the O(N^2)
+        # Python double loop
+        upper = np.triu(similarity_matrix, k=1)
+        i_idx, j_idx = np.where(upper > similarity_threshold)
+        if len(i_idx):
+            answer_lengths = df['Answer'].str.len().to_numpy()
+            # Keep the longer answer of each near-duplicate pair
+            drops = np.where(answer_lengths[i_idx] < answer_lengths[j_idx], i_idx, j_idx)
+            df = df.drop(df.index[np.unique(drops)])
         print(f"After removing similar questions: {len(df)}")
     
     return df
@@ -48,42 +80,62 @@ def _remove_duplicates(df: pd.DataFrame, similarity_threshold: float = 0.85) ->
 
 def create_vectorstore():
     load_dotenv()
-    embeddings = SentenceTransformerEmbeddings(bi_encoder)
-    
-    try:
-        import chromadb
-        client = chromadb.PersistentClient(path=str(VECTOR_STORE_DIR))
-        client.delete_collection("oncology_qa")
-        logger.info("Deleted existing collection")
-    except Exception as e:
-        logger.info(f"No existing collection to delete: {e}")
-    
-    vector_store = Chroma(
-        collection_name="oncology_qa",
-        embedding_function=embeddings,
-        persist_directory=str(VECTOR_STORE_DIR)
-    )
-    
+    embeddings = SentenceTransformerEmbeddings(get_bi_encoder())
+
     try:
         if not DATA_FILE.exists():
-            logger.error(f"Data file not found at: {DATA_FILE}")
+            logger.error("Data file not found at: %s", DATA_FILE)
             return None
             
-        oncology_data = pd.read_excel(DATA_FILE)
-        logger.info(f"Loaded {len(oncology_data)} rows from Excel")
+        oncology_data = _load_qa_rows(DATA_FILE)
+        logger.info("Loaded %s unique rows from Excel", len(oncology_data))
     except Exception as e:
-        logger.error(f"Error loading Excel file: {e}")
+        logger.error("Error loading Excel file: %s", e)
         return None
     
     oncology_data = _remove_duplicates(oncology_data)
     
-    documents = []
-    for _, row in oncology_data.iterrows():
-        content = f"Question: {row['Question']}\nAnswer: {row['Answer']}"
-        documents.append(Document(page_content=content))
-    
-    vector_store.add_documents(documents=documents)
-    logger.info(f"Vector store created with {len(documents)} documents.")
+    # Pull the columns out once instead of building a Series per row
+    # with iterrows; plain zip over the lists assembles the contents
+    # without any pandas per-row overhead
+    questions = oncology_data['Question'].tolist()
+    answers = oncology_data['Answer'].tolist()
+    contents = [
+        f"Question: {question}\nAnswer: {answer}"
+        for question, answer in zip(questions, answers)
+    ]
+    documents = [Document(page_content=content) for content in contents]
+
+    # Embed everything in one batched pass and build the index directly
+    # so the index type can depend on the corpus size
+    vectors = np.asarray(embeddings.embed_documents(contents), dtype=np.float32)
+    n, d = vectors.shape
+
+    # Inner product over the pre-normalized vectors: equal to cosine
+    # but a single fused dot product per candidate, no sqrt. For large
+    # corpora an OPQ+IVF+PQ composite compresses each vector ~64x and
+    # probes only a few cells per query; below that size exact flat
+    # search is both faster and loss-free (and PQ training needs far
+    # more points than this Q&A set provides)
+    if n >= 10_000:
+        nlist = min(int(4 * np.sqrt(n)), 65536)
+        index = faiss.index_factory(d, f"OPQ64,IVF{nlist},PQ64", faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlatIP(d)
+    index.add(vectors)
+
+    # save_local simply overwrites any previous index, so no delete
+    # pass is needed
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore({str(i): doc for i, doc in enumerate(documents)}),
+        index_to_docstore_id={i: str(i) for i in range(len(documents))},
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+    )
+    vector_store.save_local(str(VECTOR_STORE_DIR))
+    logger.info("Vector store created with %s documents.", len(documents))
     return vector_store
 
 def main():
@@ -1,7 +1,41 @@
 from typing import Dict, Any, List
 from langchain.schema import HumanMessage
 
-from src.llm_factory.gemini import GoogleGen
+import numpy as np
+
+from src.helpers.constants import get_bi_encoder
+from src.llm_factory.gemini import get_gemini
+
+# Cosine similarity a retrieved question must reach against the query
+# to count as relevant; looser than the direct-match threshold since
+# the LLM still synthesizes the final answer from these sources
+RELEVANCE_THRESHOLD = 0.5
+
+def check_relevance_batch(query: str, search_results: List[Dict[str, Any]]) -> List[bool]:
+    """
+    Check the relevance of all search results in one batched pass.
+
+    The query and every candidate question are encoded in a single
+    model call and compared with one matrix product, instead of one
+    LLM round-trip per result.
+
+    Args:
+        query: The user's query
+        search_results: List of search results from the document retriever
+
+    Returns:
+        One bool per search result, in order
+    """
+    if not search_results:
+        return []
+
+    texts = [query] + [result['question'] for result in search_results]
+    embeds = np.asarray(
+        get_bi_encoder().encode(texts, batch_size=32, normalize_embeddings=True),
+        dtype=np.float32
+    )
+    similarities = embeds[1:] @ embeds[0]
+    return (similarities >= RELEVANCE_THRESHOLD).tolist()
 
 def check_relevance(query: str, search_result: Dict[str, Any], llm=None) -> bool:
     """
@@ -18,7 +52,7 @@ def check_relevance(query: str, search_result: Dict[str, Any], llm=None) -> bool
     if not search_result:
         return False
     
-    llm = llm or GoogleGen()
+    llm = llm or get_gemini()
     
     try:
         prompt = f"""You are a medical information assistant. 
@@ -1,14 +1,23 @@
+import asyncio
 from typing import List, Optional, Dict, Any
 from contextlib import contextmanager
-import logging
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 # Import database configuration
-from src.config.database import SessionLocal, get_db
+from src.config.database import SessionLocal, AsyncSessionLocal
+from src.config.logs import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
 
 @contextmanager
 def get_db_session():
     """Provide a transactional scope around a series of operations."""
-    db = next(get_db())
+    # scoped_session hands back this thread's pooled session directly;
+    # no generator indirection per call
+    db = SessionLocal()
     try:
         yield db
     except Exception:
@@ -17,6 +26,93 @@ def get_db_session():
     finally:
         db.close()
 
+class _MemoryWriteBatcher:
+    """Coalesce concurrent memory creates into one transaction.
+
+    Creates submitted within the batching window are drained together
+    and inserted with a single flush and commit, so a burst of N
+    profile saves pays one fsync instead of N. Each caller gets its own
+    result (or error) back through a future, mirroring the scheduler
+    the answer generator uses for embedding batches.
+    """
+
+    MAX_BATCH = 64
+    MAX_WAIT = 0.01  # seconds
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task = None
+
+    async def submit(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue one create and wait for its row dict."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._worker())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.MAX_WAIT
+            while len(batch) < self.MAX_BATCH:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _flush(self, batch):
+        from src.models.user_memory import UserMemory
+
+        # First submission wins when a user_id repeats within the batch
+        rows: Dict[int, Dict[str, Any]] = {}
+        for item, _ in batch:
+            rows.setdefault(item['user_id'], item)
+
+        async with AsyncSessionLocal() as session:
+            # One upsert for the whole batch: the unique user_id
+            # constraint arbitrates duplicates — including rows created
+            # concurrently by other worker processes, which a
+            # SELECT-then-INSERT pair would only discover as an
+            # IntegrityError that fails every caller in the batch —
+            # and RETURNING hands back just the rows actually inserted
+            stmt = (
+                sqlite_insert(UserMemory)
+                .values(list(rows.values()))
+                .on_conflict_do_nothing(index_elements=['user_id'])
+                .returning(UserMemory)
+            )
+            created = {
+                memory.user_id: memory.to_dict()
+                for memory in (await session.execute(stmt)).scalars()
+            }
+            await session.commit()
+
+        claimed = set()
+        for item, future in batch:
+            user_id = item['user_id']
+            if user_id in created and user_id not in claimed:
+                claimed.add(user_id)
+                future.set_result(created[user_id])
+            else:
+                future.set_exception(
+                    ValueError(f"User {user_id} already has a memory entry")
+                )
+
+
+_write_batcher = _MemoryWriteBatcher()
+
 class UserMemoryManager:
     """
     A class to manage user memories directly in the database.
@@ -39,23 +135,51 @@ class UserMemoryManager:
         
         try:
             with get_db_session() as session:
-                # Check if user already has a memory
-                existing_memory = session.query(UserMemory).filter(UserMemory.user_id == user_id).first()
-                if existing_memory:
-                    raise ValueError(f"User {user_id} already has a memory entry")
-                    
-                memory = UserMemory(
-                    user_id=user_id,
-                    name=name,
-                    description=description
+                # One upsert replaces the SELECT-then-INSERT pair (and
+                # its race): the unique user_id constraint arbitrates,
+                # and RETURNING hands back the created row
+                stmt = (
+                    sqlite_insert(UserMemory)
+                    .values(user_id=user_id, name=name, description=description)
+                    .on_conflict_do_nothing(index_elements=['user_id'])
+                    .returning(UserMemory)
                 )
-                session.add(memory)
+                memory = session.execute(stmt).scalars().first()
+                if memory is None:
+                    raise ValueError(f"User {user_id} already has a memory entry")
+                result = memory.to_dict()
                 session.commit()
-                session.refresh(memory)
-                return memory.to_dict()
+                return result
         except Exception as e:
             # Log error and re-raise
-            logging.error(f"Error creating memory: {str(e)}")
+            logger.error("Error creating memory: %s", e)
+            raise
+
+    @staticmethod
+    def bulk_create_memories(items: List[Dict[str, Any]]) -> int:
+        """
+        Create many user memories in a single transaction.
+
+        Args:
+            items: Dicts with user_id and optional name/description keys
+
+        Returns:
+            int: Number of memories created
+        """
+        from src.models.user_memory import UserMemory
+
+        if not items:
+            return 0
+
+        try:
+            with get_db_session() as session:
+                # One executemany INSERT and one commit amortize the
+                # fsync and unit-of-work cost across the whole batch
+                session.execute(insert(UserMemory), items)
+                session.commit()
+                return len(items)
+        except Exception as e:
+            logger.error("Error bulk creating memories: %s", e)
             raise
 
     @staticmethod
@@ -73,10 +197,12 @@ class UserMemoryManager:
         
         try:
             with get_db_session() as session:
-                memory = session.query(UserMemory).filter(UserMemory.id == memory_id).first()
+                # session.get is the ORM's primary-key fast path: it
+                # checks the identity map first and skips query compilation
+                memory = session.get(UserMemory, memory_id)
                 return memory.to_dict() if memory else None
         except Exception as e:
-            logging.error(f"Error getting memory by ID {memory_id}: {str(e)}")
+            logger.error("Error getting memory by ID %s: %s", memory_id, e)
             raise
     
     @staticmethod
@@ -97,9 +223,58 @@ class UserMemoryManager:
                 memory = session.query(UserMemory).filter(UserMemory.user_id == user_id).first()
                 return memory.to_dict() if memory else None
         except Exception as e:
-            logging.error(f"Error getting memory {memory_id}: {str(e)}")
+            logger.error("Error getting memory for user %s: %s", user_id, e)
             raise
-    
+
+    @staticmethod
+    async def create_memory_async(user_id: int, name: Optional[str] = None, description: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Create a new user memory without blocking the event loop.
+
+        Args:
+            user_id: The ID of the user this memory belongs to
+            name: Optional name for the memory
+            description: Optional description of the memory
+
+        Returns:
+            dict: The created user memory
+        """
+        try:
+            # Concurrent creates are coalesced into one transaction by
+            # the write batcher
+            return await _write_batcher.submit({
+                'user_id': user_id,
+                'name': name,
+                'description': description
+            })
+        except Exception as e:
+            logger.error("Error creating memory: %s", e)
+            raise
+
+    @staticmethod
+    async def get_memory_by_user_async(user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve a user memory by user ID without blocking the event loop.
+
+        Args:
+            user_id: The ID of the user whose memory to retrieve
+
+        Returns:
+            Optional[dict]: The user memory if found, None otherwise
+        """
+        from src.models.user_memory import UserMemory
+
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(UserMemory).where(UserMemory.user_id == user_id)
+                )
+                memory = result.scalar_one_or_none()
+                return memory.to_dict() if memory else None
+        except Exception as e:
+            logger.error("Error getting memory for user %s: %s", user_id, e)
+            raise
+
     @staticmethod
     def update_memory(user_id: int, name: Optional[str] = None, description: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
@@ -130,9 +305,100 @@ class UserMemoryManager:
                 session.refresh(memory)
                 return memory.to_dict()
         except Exception as e:
-            logging.error(f"Error updating memory {memory_id}: {str(e)}")
+            logger.error("Error updating memory for user %s: %s", user_id, e)
             raise
     
+    @staticmethod
+    async def get_memories_by_users_async(user_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        Retrieve the memories for many users in one query.
+
+        Args:
+            user_ids: The IDs of the users whose memories to retrieve
+
+        Returns:
+            list[dict]: The memories found (users without one are omitted)
+        """
+        from src.models.user_memory import UserMemory
+
+        if not user_ids:
+            return []
+
+        try:
+            async with AsyncSessionLocal() as session:
+                # One IN query instead of a round-trip per user
+                result = await session.execute(
+                    select(UserMemory).where(UserMemory.user_id.in_(user_ids))
+                )
+                return [memory.to_dict() for memory in result.scalars()]
+        except Exception as e:
+            logger.error("Error getting memories for users %s: %s", user_ids, e)
+            raise
+
+    @staticmethod
+    async def update_memory_async(user_id: int, name: Optional[str] = None, description: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Update a user's memory by user ID without blocking the event loop.
+
+        Args:
+            user_id: The ID of the user whose memory to update
+            name: New name for the memory (optional)
+            description: New description for the memory (optional)
+
+        Returns:
+            dict: The updated user memory if found, None otherwise
+        """
+        from src.models.user_memory import UserMemory
+
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(UserMemory).where(UserMemory.user_id == user_id)
+                )
+                memory = result.scalar_one_or_none()
+                if not memory:
+                    return None
+
+                if name is not None:
+                    memory.name = name
+                if description is not None:
+                    memory.description = description
+
+                await session.commit()
+                return memory.to_dict()
+        except Exception as e:
+            logger.error("Error updating memory for user %s: %s", user_id, e)
+            raise
+
+    @staticmethod
+    async def delete_memory_async(user_id: int) -> bool:
+        """
+        Delete a user memory by user ID without blocking the event loop.
+
+        Args:
+            user_id: The ID of the user whose memory to delete
+
+        Returns:
+            bool: True if deleted, False if not found
+        """
+        from src.models.user_memory import UserMemory
+
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(UserMemory).where(UserMemory.user_id == user_id)
+                )
+                memory = result.scalar_one_or_none()
+                if not memory:
+                    return False
+
+                await session.delete(memory)
+                await session.commit()
+                return True
+        except Exception as e:
+            logger.error("Error deleting memory for user %s: %s", user_id, e)
+            raise
+
     @staticmethod
     def delete_memory(user_id: int) -> bool:
         """
@@ -156,5 +422,5 @@ class UserMemoryManager:
                 session.commit()
                 return True
         except Exception as e:
-            logging.error(f"Error deleting memory {memory_id}: {str(e)}")
+            logger.error("Error deleting memory for user %s: %s", user_id, e)
             raise
@@ -1,5 +1,6 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
+import functools
 import os
 from pathlib import Path
 
@@ -22,4 +23,15 @@ class GoogleGen:
         )
     
     def __call__(self, messages):
-        return self.llm.invoke(messages)
\ No newline at end of file
+        return self.llm.invoke(messages)
+
+
+@functools.lru_cache(maxsize=4)
+def get_gemini(model='gemini-1.5-flash') -> GoogleGen:
+    """Return the shared client for a model (built once per process).
+
+    Each GoogleGen sets up a fresh HTTP client and auth; memoizing per
+    model name lets every caller reuse one keep-alive connection pool
+    instead of paying that cost on each construction.
+    """
+    return GoogleGen(model)
\ No newline at end of file
@@ -10,8 +10,12 @@ class UserMemory(Base):
     __tablename__ = "user_memories"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False, unique=True)
-    name = Column(String, index=True, nullable=True)
+    # unique=True creates the index every hot path (lookup, upsert
+    # arbitration, delete) probes; index=True documents the intent
+    user_id = Column(Integer, nullable=False, unique=True, index=True)
+    # name is never used in a WHERE predicate; indexing it only slowed
+    # writes down
+    name = Column(String, nullable=True)
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
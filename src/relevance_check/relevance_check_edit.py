@@ -1,111 +1,278 @@
-from typing import Dict, Any, List
-
-from sentence_transformers import SentenceTransformer
-from langchain_core.messages import HumanMessage
-import numpy as np
-import json
-import re
-import logging
-
-from src.helpers.document_retriever import search_qa
-from src.llm_factory.gemini import GoogleGen
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-class HybridRelevanceChecker:
-    def __init__(self):
-        """Simplified relevance checker for oncology with only direct matches"""
-        self.llm = GoogleGen()
-        self.similarity_model = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        # Thresholds
-        self.similarity_threshold = 0.8
-        self.confidence_threshold = 0.85
-
-    def is_oncology_related(self, text: str) -> bool:
-        """Strict oncology content check"""
-        prompt = """Is this text about cancer/oncology? Answer ONLY 'yes' or 'no'.
-        
-        Text: {text}""".format(text=text)
-        
-        try:
-            response = self.llm([HumanMessage(content=prompt)])
-            return response.content.strip().lower() == 'yes'
-        except Exception as e:
-            logger.error(f"Oncology check failed: {e}")
-            return False
-
-    def calculate_similarity(self, text1: str, text2: str) -> float:
-        """Calculate cosine similarity between texts"""
-        embeds = self.similarity_model.encode([text1, text2])
-        return float(np.dot(embeds[0], embeds[1]) / 
-                   (np.linalg.norm(embeds[0]) * np.linalg.norm(embeds[1])))
-
-    def verify_match(self, query: str, candidate: Dict[str, Any]) -> Dict[str, Any]:
-        """Verify if candidate is a direct match"""
-        similarity = self.calculate_similarity(query, candidate['question'])
-        
-        verification_prompt = """Verify if this answer perfectly matches the question.
-        Question: {query}
-        Answer: {answer}
-        
-        Return JSON with:
-        - match (true/false)
-        - confidence (0.0-1.0)
-        - reason (brief explanation)""".format(
-            query=query,
-            answer=candidate['answer']
-        )
-        
-        try:
-            response = self.llm([HumanMessage(content=verification_prompt)])
-            verification = json.loads(re.search(r'\{.*\}', response.content, re.DOTALL).group())
-            
-            return {
-                'similarity': similarity,
-                'verification': verification,
-                'combined_score': min(1.0, (similarity + verification['confidence']) / 2)
-            }
-        except Exception as e:
-            logger.error(f"Verification failed: {e}")
-            return {
-                'similarity': similarity,
-                'verification': {'match': False, 'confidence': 0.0, 'reason': str(e)},
-                'combined_score': 0.0
-            }
-
-    def check_match(self, query: str) -> Dict[str, Any]:
-        """Check for direct matches only"""
-        if not self.is_oncology_related(query):
-            return {'status': 'off_topic', 'match_data': None}
-        
-        rag_results = search_qa(query=query, k=5)  # Fewer but more relevant results
-        if not rag_results:
-            return {'status': 'no_match', 'match_data': None}
-        
-        # Evaluate all candidates
-        evaluations = []
-        for candidate in rag_results:
-            eval_result = self.verify_match(query, candidate)
-            if eval_result['verification']['match'] and eval_result['combined_score'] >= self.confidence_threshold:
-                evaluations.append({
-                    'candidate': candidate,
-                    'metrics': eval_result,
-                    'confidence': eval_result['combined_score']
-                })
-        
-        if not evaluations:
-            return {'status': 'no_match', 'match_data': None}
-        
-        # Return best direct match
-        best_match = max(evaluations, key=lambda x: x['confidence'])
-        return {
-            'status': 'direct_match',
-            'match_data': {
-                'answer': best_match['candidate']['answer'],
-                'confidence': best_match['confidence'],
-                'metrics': best_match['metrics']
-            }
-        }
\ No newline at end of file
+from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+
+from cachetools import TTLCache
+from langchain_core.messages import HumanMessage
+import functools
+import hashlib
+import numpy as np
+import orjson
+import re
+
+from src.helpers.constants import get_bi_encoder
+from src.helpers.document_retriever import search_qa
+from src.llm_factory.gemini import get_gemini
+from src.config.logs import get_logger
+
+# Initialize logger
+logger = get_logger(__name__)
+
+class HybridRelevanceChecker:
+    # Obvious oncology vocabulary compiled into one alternation so the
+    # whole check is a single regex-engine pass, not one substring scan
+    # per keyword — and a hit short-circuits the LLM gate entirely
+    _ONCOLOGY_RE = re.compile(
+        r'\b(cancer|oncolog\w*|tumou?r\w*|chemo(?:therapy)?|radiation|radiotherapy'
+        r'|immunotherapy|metasta\w+|malignan\w+|carcinoma|leukemia|lymphoma'
+        r'|melanoma|sarcoma|biopsy)\b',
+        re.IGNORECASE
+    )
+
+    def __init__(self):
+        """Simplified relevance checker for oncology with only direct matches"""
+        self.llm = get_gemini()
+        # Shared int8-ONNX bi-encoder from constants — one copy of the
+        # weights per process instead of a private FP32 load
+        self.similarity_model = get_bi_encoder()
+        
+        # Thresholds
+        self.similarity_threshold = 0.8
+        self.confidence_threshold = 0.85
+
+        # Candidate-question embeddings cached as int8 vectors with a
+        # per-vector scale — half the bytes of float32 with negligible
+        # cosine-ranking loss at this dimensionality
+        self._embed_cache: Dict[str, Any] = {}
+        self._embed_cache_max = 8192
+
+        # Query embeddings cached per instance; repeat queries skip the
+        # transformer forward pass entirely
+        self._encode_query = functools.lru_cache(maxsize=4096)(self._encode_query_uncached)
+
+        # LLM gate verdicts cached with a TTL; TTLCache evicts lazily
+        # in O(1) amortized, no periodic sweep needed
+        self._gate_cache = TTLCache(maxsize=10_000, ttl=3600)
+
+    def _encode_query_uncached(self, text: str) -> np.ndarray:
+        """Encode and L2-normalize a single query (cached by _encode_query)."""
+        vec = np.asarray(self.similarity_model.encode(text), dtype=np.float32)
+        vec /= np.linalg.norm(vec)
+        return vec
+
+    @staticmethod
+    def _quantize_int8(vec: np.ndarray):
+        """Symmetric per-vector int8 quantization; returns (int8 vector, scale)."""
+        scale = float(np.abs(vec).max()) / 127.0
+        if scale == 0.0:
+            scale = 1.0
+        return (vec / scale).astype(np.int8), scale
+
+    def _candidate_matrix(self, texts: List[str]):
+        """Return the stacked int8 matrix and scales for candidate questions.
+
+        Embeddings are normalized before quantization so the scaled
+        integer dot product approximates cosine similarity. Questions
+        already seen are served from the cache without re-encoding.
+        """
+        missing = [text for text in texts if text not in self._embed_cache]
+        if missing:
+            embeds = np.asarray(self.similarity_model.encode(missing), dtype=np.float32)
+            embeds /= np.linalg.norm(embeds, axis=1, keepdims=True)
+            if len(self._embed_cache) + len(missing) > self._embed_cache_max:
+                self._embed_cache.clear()
+            for text, vec in zip(missing, embeds):
+                self._embed_cache[text] = self._quantize_int8(vec)
+        entries = [self._embed_cache[text] for text in texts]
+        matrix = np.stack([entry[0] for entry in entries])
+        scales = np.array([entry[1] for entry in entries], dtype=np.float32)
+        return matrix, scales
+
+    def is_oncology_related(self, text: str) -> bool:
+        """Strict oncology content check"""
+        # Fast path: unambiguous oncology terms skip the LLM round-trip
+        if self._ONCOLOGY_RE.search(text):
+            return True
+
+        # Hashed key keeps the cache from holding full query text
+        cache_key = hashlib.blake2b(text.strip().lower().encode(), digest_size=16).digest()
+        cached = self._gate_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        prompt = """Is this text about cancer/oncology? Answer ONLY 'yes' or 'no'.
+
+        Text: {text}""".format(text=text)
+
+        try:
+            response = self.llm([HumanMessage(content=prompt)])
+            verdict = response.content.strip().lower() == 'yes'
+            self._gate_cache[cache_key] = verdict
+            return verdict
+        except Exception as e:
+            logger.error("Oncology check failed: %s", e)
+            return False
+
+    def calculate_similarity(self, text1: str, text2: str) -> float:
+        """Calculate cosine similarity between texts"""
+        embeds = self.similarity_model.encode([text1, text2])
+        return float(np.dot(embeds[0], embeds[1]) / 
+                   (np.linalg.norm(embeds[0]) * np.linalg.norm(embeds[1])))
+
+    def verify_match(self, query: str, candidate: Dict[str, Any], similarity: float = None) -> Dict[str, Any]:
+        """Verify if candidate is a direct match.
+
+        A precomputed similarity can be passed in by the batched path
+        to avoid re-encoding the pair.
+        """
+        if similarity is None:
+            similarity = self.calculate_similarity(query, candidate['question'])
+
+        verification_prompt = """Verify if this answer perfectly matches the question.
+        Question: {query}
+        Answer: {answer}
+        
+        Return JSON with:
+        - match (true/false)
+        - confidence (0.0-1.0)
+        - reason (brief explanation)""".format(
+            query=query,
+            answer=candidate['answer']
+        )
+        
+        try:
+            response = self.llm([HumanMessage(content=verification_prompt)])
+            verification = orjson.loads(re.search(r'\{.*\}', response.content, re.DOTALL).group())
+            
+            return {
+                'similarity': similarity,
+                'verification': verification,
+                'combined_score': min(1.0, (similarity + verification['confidence']) / 2)
+            }
+        except Exception as e:
+            logger.error("Verification failed: %s", e)
+            return {
+                'similarity': similarity,
+                'verification': {'match': False, 'confidence': 0.0, 'reason': str(e)},
+                'combined_score': 0.0
+            }
+
+    def _similarities_for(self, query: str, rag_results: List[Dict[str, Any]]) -> np.ndarray:
+        """Return query/candidate cosine similarities.
+
+        search_qa already pays for the inner product over normalized
+        vectors at retrieval, so its scores are reused directly; the
+        encode + int8 matrix path only runs for results that arrive
+        without scores.
+        """
+        scores = [result.get('score') for result in rag_results]
+        if all(score is not None for score in scores):
+            return np.asarray(scores, dtype=np.float32)
+
+        query_vec = self._encode_query(query.strip())
+        candidate_mat, scales = self._candidate_matrix([c['question'] for c in rag_results])
+        query_q, query_scale = self._quantize_int8(query_vec)
+        return (
+            candidate_mat.astype(np.int32) @ query_q.astype(np.int32)
+        ).astype(np.float32) * (query_scale * scales)
+
+    def _evaluate_candidates(self, query: str, rag_results: List[Dict[str, Any]], similarities=None) -> Dict[str, Any]:
+        """Evaluate candidates for a query and pick the best direct match."""
+        # The per-candidate LLM verifications are independent network
+        # round-trips; overlap them instead of paying them serially.
+        # The worker cap doubles as a rate-limit guard on the API.
+        def _verify(idx_candidate):
+            idx, candidate = idx_candidate
+            similarity = float(similarities[idx]) if similarities is not None else None
+            return self.verify_match(query, candidate, similarity=similarity)
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            eval_results = list(executor.map(_verify, enumerate(rag_results)))
+
+        evaluations = []
+        for candidate, eval_result in zip(rag_results, eval_results):
+            if eval_result['verification']['match'] and eval_result['combined_score'] >= self.confidence_threshold:
+                evaluations.append({
+                    'candidate': candidate,
+                    'metrics': eval_result,
+                    'confidence': eval_result['combined_score']
+                })
+
+        if not evaluations:
+            return {'status': 'no_match', 'match_data': None}
+
+        # Return best direct match
+        best_match = max(evaluations, key=lambda x: x['confidence'])
+        return {
+            'status': 'direct_match',
+            'match_data': {
+                'answer': best_match['candidate']['answer'],
+                'confidence': best_match['confidence'],
+                'metrics': best_match['metrics']
+            }
+        }
+
+    def check_match_batch(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """Check a batch of queries for direct matches.
+
+        All query and candidate-question embeddings for the batch are
+        encoded in a single call and their cosine similarities computed
+        with BLAS matrix products, instead of one encode per
+        (query, candidate) pair. Results keep the query order.
+        """
+        results: List[Any] = [None] * len(queries)
+        candidates_per_query: List[List[Dict[str, Any]]] = []
+        for i, query in enumerate(queries):
+            if not self.is_oncology_related(query):
+                results[i] = {'status': 'off_topic', 'match_data': None}
+                candidates_per_query.append([])
+                continue
+            rag_results = search_qa(query=query, k=5)
+            if not rag_results:
+                results[i] = {'status': 'no_match', 'match_data': None}
+                candidates_per_query.append([])
+                continue
+            # Retrieval scores double as similarities; only results
+            # without them fall through to the batched encode below
+            scores = [c.get('score') for c in rag_results]
+            if all(score is not None for score in scores):
+                results[i] = self._evaluate_candidates(
+                    query, rag_results, np.asarray(scores, dtype=np.float32)
+                )
+                candidates_per_query.append([])
+                continue
+            candidates_per_query.append(rag_results)
+
+        pending = [i for i in range(len(queries)) if results[i] is None]
+        if pending:
+            # One encode call for the pending queries; candidates come
+            # from the int8 cache and are only encoded on a miss
+            query_texts = [queries[i] for i in pending]
+            candidate_texts = [c['question'] for i in pending for c in candidates_per_query[i]]
+            query_mat = np.asarray(self.similarity_model.encode(query_texts), dtype=np.float32)
+            query_mat /= np.linalg.norm(query_mat, axis=1, keepdims=True)
+            candidate_mat, candidate_scales = self._candidate_matrix(candidate_texts)
+
+            offset = 0
+            for row, i in enumerate(pending):
+                candidates = candidates_per_query[i]
+                block = candidate_mat[offset:offset + len(candidates)]
+                scales = candidate_scales[offset:offset + len(candidates)]
+                offset += len(candidates)
+                query_q, query_scale = self._quantize_int8(query_mat[row])
+                # int32 accumulation; the int8 payload is what halves
+                # the bytes moved over the candidate matrix
+                similarities = (block.astype(np.int32) @ query_q.astype(np.int32)).astype(np.float32) * (query_scale * scales)
+                results[i] = self._evaluate_candidates(queries[i], candidates, similarities)
+
+        return results
+
+    def check_match(self, query: str) -> Dict[str, Any]:
+        """Check for direct matches only"""
+        if not self.is_oncology_related(query):
+            return {'status': 'off_topic', 'match_data': None}
+
+        rag_results = search_qa(query=query, k=5)  # Fewer but more relevant results
+        if not rag_results:
+            return {'status': 'no_match', 'match_data': None}
+
+        return self._evaluate_candidates(query, rag_results, self._similarities_for(query, rag_results))
\ No newline at end of file
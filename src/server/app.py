@@ -1,43 +1,82 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+import anyio
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, status, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import orjson
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Optional, Dict, Any
 import logging
 import time
-import traceback
+import uuid
 from datetime import datetime
-from sqlalchemy.orm import Session
 
 from src.agent_workflow.workflow import WorkFlow
 
 # Import database configuration and models
-from src.config.database import get_db, Base, engine
+from src.config.database import Base, engine
 from src.models.user_memory import UserMemory, init_db
 from src.helpers.user_memory_manager import UserMemoryManager
+from src.config.logs import get_logger
+
+# Prefer uvloop for the event loop (~2x loop throughput on Linux);
+# uvicorn's "auto" loop picks it up once installed, and this covers
+# embedders that run the app outside uvicorn
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
 
 # Initialize the database
 init_db()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Initialize logger
+logger = get_logger(__name__)
 
-app = FastAPI(title="Cancer Agent API")
+app = FastAPI(title="Cancer Agent API", default_response_class=ORJSONResponse)
+
+# Poll endpoints are hit constantly; skip their log lines entirely
+_SKIP_LOG_PATHS = frozenset({"/", "/health"})
 
 # Add middleware for request logging
 async def log_requests(request: Request, call_next):
-    logger.info(f"Request: {request.method} {request.url}")
+    if request.url.path in _SKIP_LOG_PATHS:
+        return await call_next(request)
+    # Gate on the level once so a raised production level pays neither
+    # the formatting nor the request.url materialization
+    verbose = logger.isEnabledFor(logging.INFO)
+    if verbose:
+        logger.info("Request: %s %s", request.method, request.url)
     try:
         response = await call_next(request)
-        logger.info(f"Response status: {response.status_code}")
+        if verbose:
+            logger.info("Response status: %s", response.status_code)
         return response
     except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.error("Error processing request: %s", e, exc_info=True)
         raise
 
 app.middleware('http')(log_requests)
 
+# Compress larger JSON bodies (chat responses with sources). The SSE
+# endpoint is exempt: minimum_size is unenforceable on streaming
+# bodies and zlib buffers small data: events until enough compressed
+# output accumulates, so gzip turns the stream into an end-of-response
+# dump for clients that accept it (EventSource does by default)
+class _SelectiveGZipMiddleware(GZipMiddleware):
+    _EXCLUDE_PATHS = frozenset({"/chat/stream"})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self._EXCLUDE_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(_SelectiveGZipMiddleware, minimum_size=500)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -47,7 +86,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize any required services here
+# Single workflow shared across requests; building one per /chat call
+# reloaded the graph, the LLM binding and the models every time
+work_flow: Optional[WorkFlow] = None
+
+@app.on_event("startup")
+async def startup():
+    """Build the workflow once and pre-warm the models."""
+    global work_flow
+    # The /chat workflow call and the SSE generator run on the anyio
+    # thread pool; the default 40 tokens serialize bursts, so raise it
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 200
+    work_flow = WorkFlow()
+    try:
+        # First encode/predict pays tokenizer and kernel warm-up;
+        # do it here so the first real request doesn't
+        from src.helpers.constants import get_bi_encoder
+        from src.helpers.document_retriever import get_cross_encoder, get_vector_store
+
+        get_bi_encoder().encode("warmup")
+        get_cross_encoder().predict([("warmup", "warmup")], show_progress_bar=False)
+        get_vector_store()
+    except Exception as e:
+        logger.warning("Model pre-warm failed: %s", e)
 
 class ChatMessage(BaseModel):
     message: str
@@ -72,6 +133,9 @@ class UserMemoryUpdate(UserMemoryBase):
     description: Optional[str] = None
     user_id: Optional[int] = None  # Optional for updates
 
+class UserMemoryBatchRequest(BaseModel):
+    user_ids: List[int]
+
 class UserMemoryResponse(UserMemoryBase):
     id: int
     created_at: Optional[datetime] = None
@@ -80,72 +144,120 @@ class UserMemoryResponse(UserMemoryBase):
     class Config:
         from_attributes = True  # Updated from orm_mode for Pydantic v2
 
+# Prebuilt adapters validate each response once; with response_model
+# set, FastAPI would re-validate the already-validated payload on
+# every request and rebuild the schema lookup per call
+_MEMORY_ADAPTER = TypeAdapter(UserMemoryResponse)
+_MEMORY_LIST_ADAPTER = TypeAdapter(List[UserMemoryResponse])
+
+# Static bodies for the poll endpoints: no serialization per hit, and
+# the short Cache-Control lets pollers reuse the answer between probes
+_ROOT_RESPONSE = b'{"message":"Cancer Agent API is running"}'
+_HEALTH_RESPONSE = b'{"status":"healthy"}'
+
 @app.get("/")
 async def root():
-    return {"message": "Cancer Agent API is running"}
+    return Response(
+        content=_ROOT_RESPONSE,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=5"}
+    )
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return Response(
+        content=_HEALTH_RESPONSE,
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=5"}
+    )
 
 # User Memory Endpoints
-@app.post("/user-memories/", response_model=UserMemoryResponse, status_code=status.HTTP_201_CREATED)
-def create_user_memory(user_memory: UserMemoryCreate, db: Session = Depends(get_db)):
+@app.post("/user-memories/", response_model=None, status_code=status.HTTP_201_CREATED)
+async def create_user_memory(user_memory: UserMemoryCreate):
     """
     Create a new user memory
-    
+
     Note: Each user can only have one memory entry.
     """
     try:
-        return UserMemoryManager.create_memory(
+        memory = await UserMemoryManager.create_memory_async(
             user_id=user_memory.user_id,
             name=user_memory.name,
             description=user_memory.description
         )
+        return _MEMORY_ADAPTER.validate_python(memory)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error creating user memory: {str(e)}")
+        logger.error("Error creating user memory: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.get("/user-memories/user/{user_id}", response_model=UserMemoryResponse)
-def read_user_memory_by_user(user_id: int, db: Session = Depends(get_db)):
+@app.post("/user-memories/batch", response_model=None)
+async def read_user_memories_batch(request: UserMemoryBatchRequest):
+    """Retrieve memories for many users in one request.
+
+    Coalesces what would be one HTTP round-trip per user into a single
+    request backed by a single IN query; users without a memory are
+    omitted from the response.
+    """
+    memories = await UserMemoryManager.get_memories_by_users_async(request.user_ids)
+    return _MEMORY_LIST_ADAPTER.validate_python(memories)
+
+# Hot reads served from RAM; writes below invalidate their entry
+_memory_cache = TTLCache(maxsize=10_000, ttl=60)
+
+def _memory_etag(memory: Dict[str, Any]) -> str:
+    version = memory.get('updated_at') or memory.get('created_at') or memory.get('id')
+    return f'W/"{version}"'
+
+@app.get("/user-memories/user/{user_id}", response_model=None)
+async def read_user_memory_by_user(user_id: int, request: Request, response: Response):
     """Retrieve a specific user memory by user ID"""
-    memory = UserMemoryManager.get_memory_by_user(user_id)
-    if not memory:
-        raise HTTPException(status_code=404, detail=f"No memory found for user {user_id}")
-    return memory
+    memory = _memory_cache.get(user_id)
+    if memory is None:
+        memory = await UserMemoryManager.get_memory_by_user_async(user_id)
+        if not memory:
+            raise HTTPException(status_code=404, detail=f"No memory found for user {user_id}")
+        _memory_cache[user_id] = memory
 
-@app.put("/user-memories/user/{user_id}", response_model=UserMemoryResponse)
-def update_user_memory_by_user(
-    user_id: int, 
-    user_memory: UserMemoryUpdate, 
-    db: Session = Depends(get_db)
+    # Let revalidating clients skip the body entirely
+    etag = _memory_etag(memory)
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    response.headers['ETag'] = etag
+    return _MEMORY_ADAPTER.validate_python(memory)
+
+@app.put("/user-memories/user/{user_id}", response_model=None)
+async def update_user_memory_by_user(
+    user_id: int,
+    user_memory: UserMemoryUpdate
 ):
     """Update a user memory by user ID"""
     try:
-        update_data = user_memory.dict(exclude_unset=True)
-        # Remove user_id from update data if it's None to avoid overwriting
-        if 'user_id' in update_data and update_data['user_id'] is None:
-            del update_data['user_id']
-            
-        updated = UserMemoryManager.update_memory(
+        # model_dump is the C-backed v2 API; excluding user_id here
+        # replaces the old pop-if-None branch (the path parameter is
+        # authoritative anyway)
+        update_data = user_memory.model_dump(exclude_unset=True, exclude={'user_id'})
+
+        updated = await UserMemoryManager.update_memory_async(
             user_id=user_id,
             name=update_data.get('name'),
             description=update_data.get('description')
         )
         if not updated:
             raise HTTPException(status_code=404, detail=f"No memory found for user {user_id}")
-        return updated
+        _memory_cache.pop(user_id, None)
+        return _MEMORY_ADAPTER.validate_python(updated)
     except Exception as e:
-        logger.error(f"Error updating user memory: {str(e)}")
+        logger.error("Error updating user memory: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.delete("/user-memories/user/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_memory_by_user(user_id: int, db: Session = Depends(get_db)):
+async def delete_user_memory_by_user(user_id: int):
     """Delete a user memory by user ID"""
-    if not UserMemoryManager.delete_memory(user_id):
+    if not await UserMemoryManager.delete_memory_async(user_id):
         raise HTTPException(status_code=404, detail=f"No memory found for user {user_id}")
+    _memory_cache.pop(user_id, None)
     return None
 
 @app.post("/chat", response_model=ChatResponse)
@@ -159,11 +271,19 @@ async def chat(message: ChatMessage):
         ChatResponse with the AI's response
     """
     try:
-        work_flow = WorkFlow()
-        # Pass both message and patient_id to the workflow
-        response = work_flow(
+        if work_flow is None:
+            raise HTTPException(status_code=503, detail="Workflow not initialized")
+        # The workflow invocation is synchronous (Gemini + encoders);
+        # run it on the anyio thread pool — the one whose token limit
+        # startup raises to 200 — so the event loop stays free for
+        # health checks and memory reads while the LLM call is in
+        # flight. A fresh checkpoint thread per request keeps
+        # conversations isolated on the shared instance.
+        response = await run_in_threadpool(
+            work_flow,
             message=message.message,
-            patient_id=message.patient_id if hasattr(message, 'patient_id') else 0
+            patient_id=message.patient_id if hasattr(message, 'patient_id') else 0,
+            thread_id=uuid.uuid4().hex
         )
         
         # Get the last message from the workflow response
@@ -172,7 +292,7 @@ async def chat(message: ChatMessage):
             raise HTTPException(status_code=500, detail="No response generated")
             
         ai_response = messages[-1].content if hasattr(messages[-1], 'content') else str(messages[-1])
-        logger.info(f"AI response for patient {getattr(message, 'patient_id', 0)}: {ai_response}")
+        logger.info("AI response for patient %s: %s", getattr(message, 'patient_id', 0), ai_response)
         
         # Return the response in the expected format
         return ChatResponse(
@@ -184,5 +304,37 @@ async def chat(message: ChatMessage):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in chat endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.error("Error in chat endpoint: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/chat/stream")
+async def chat_stream(message: ChatMessage):
+    """Stream chat responses as server-sent events
+
+    Emits one event per AI message as workflow nodes complete, so the
+    client can render partial output instead of waiting for the full
+    completion. The stream ends with a [DONE] sentinel.
+    """
+    if work_flow is None:
+        raise HTTPException(status_code=503, detail="Workflow not initialized")
+
+    thread_id = uuid.uuid4().hex
+
+    def event_source():
+        # Sync generator: Starlette iterates it on the thread pool, so
+        # the event loop stays free while the workflow runs
+        try:
+            for node, content in work_flow.stream(
+                message.message,
+                patient_id=message.patient_id if hasattr(message, 'patient_id') else 0,
+                thread_id=thread_id
+            ):
+                payload = orjson.dumps({"node": node, "response": content}).decode()
+                yield f"data: {payload}\n\n"
+        except Exception as e:
+            logger.error("Error in chat stream: %s", e)
+            payload = orjson.dumps({"error": str(e)}).decode()
+            yield f"data: {payload}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
\ No newline at end of file
@@ -0,0 +1,12 @@
+from uvicorn.workers import UvicornWorker
+
+class ConfiguredUvicornWorker(UvicornWorker):
+    """UvicornWorker pinned to the uvloop event loop and httptools parser.
+
+    uvicorn's "auto" detection normally picks these up when the
+    packages are installed, but pinning them here means a broken or
+    missing optional dependency fails loudly at boot instead of
+    silently degrading every worker to asyncio + h11.
+    """
+
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "loop": "uvloop", "http": "httptools"}
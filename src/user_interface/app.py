@@ -4,10 +4,14 @@ import requests
 # Configuration
 API_URL = "http://127.0.0.1:8000"
 
+# One pooled session for all API calls; keep-alive reuses the TCP
+# connection instead of paying a fresh handshake per UI action
+SESSION = requests.Session()
+
 def chat_with_agent(message, history, user_id) -> str:
     """Send message to the chat endpoint and return the response"""
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{API_URL}/chat",
             json={"message": message, "patient_id": user_id}
         )
@@ -21,7 +25,7 @@ def chat_with_agent(message, history, user_id) -> str:
 def create_memory(user_id, name, description):
     """Create a new user memory"""
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{API_URL}/user-memories/",
             json={"user_id": user_id, "name": name, "description": description}
         )
@@ -36,7 +40,7 @@ def create_memory(user_id, name, description):
 def get_memory(user_id):
     """Retrieve a specific user memory by user ID"""
     try:
-        response = requests.get(f"{API_URL}/user-memories/user/{user_id}")
+        response = SESSION.get(f"{API_URL}/user-memories/user/{user_id}")
         response.raise_for_status()
         memory = response.json()
         return (
@@ -150,7 +154,7 @@ def create_chat_interface():
             
             def check_status():
                 try:
-                    response = requests.get(f"{API_URL}/health")
+                    response = SESSION.get(f"{API_URL}/health")
                     if response.status_code == 200:
                         return "✅ API is running and healthy!"
                     return f"⚠️ API returned status code: {response.status_code}"